@@ -6,6 +6,7 @@ from tokenization import BrainDeadTokenizer
 from corpus import InMemoryDocument, InMemoryCorpus
 from invertedindex import InMemoryInvertedIndex
 from traversal import PostingsMerger
+from utilities import snapshot
 import re
 import sys
 
@@ -32,11 +33,15 @@ def assignment_a():
         assert [(p.document_id, p.term_frequency) for p in postings] == expected
     print(index)
 
-    # Again, for a slightly bigger corpus.
+    # Again, for a slightly bigger corpus. Loading and indexing is only done on the first
+    # run, later runs reuse a snapshot. Changing the source code invalidates the snapshot.
+    def load_and_index():
+        print("INDEXING...")
+        c = InMemoryCorpus("data/mesh.txt")
+        return c, InMemoryInvertedIndex(c, ["body"], normalizer, tokenizer)
     print("LOADING...")
-    corpus = InMemoryCorpus("data/mesh.txt")
-    print("INDEXING...")
-    index = InMemoryInvertedIndex(corpus, ["body"], normalizer, tokenizer)
+    dependencies = ["corpus.py", "dictionary.py", "invertedindex.py", "normalization.py", "tokenization.py"]
+    corpus, index = snapshot("data/mesh.txt", load_and_index, "index", dependencies)
     for (term, expected_length) in [("hydrogen", 8),
                                     ("hydrocephalus", 2)]:
         print(term)
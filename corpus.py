@@ -4,6 +4,7 @@
 from abc import ABC, abstractmethod
 import collections.abc
 from typing import Dict, Any
+from instrumentation import instrumented
 
 
 class Document(ABC):
@@ -107,6 +108,7 @@ class InMemoryCorpus(Corpus):
     def size(self) -> int:
         return len(self._documents)
 
+    @instrumented("document_fetch", "documents_fetched")
     def get_document(self, document_id: int) -> Document:
         assert 0 <= document_id < len(self._documents)
         return self._documents[document_id]
@@ -178,10 +180,11 @@ def main():
     """
     Example usage. A tiny unit test, in a sense.
     """
-    corpus = InMemoryCorpus("data/mesh.txt")
+    from utilities import snapshot
+    corpus = snapshot("data/mesh.txt", lambda: InMemoryCorpus("data/mesh.txt"), "corpus")
     print(*corpus, sep="\n")
     print(corpus.size())
-    corpus = InMemoryCorpus("data/cran.xml")
+    corpus = snapshot("data/cran.xml", lambda: InMemoryCorpus("data/cran.xml"), "corpus")
     print(*corpus, sep="\n")
     print(corpus.size())
     corpus = InMemoryCorpus("data/docs.json")
@@ -0,0 +1,266 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import functools
+import weakref
+from collections import Counter
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class Metrics:
+    """
+    Collects named counters and per-stage timers for index and query operations, so
+    that we can tell where the time of a slow query is spent.
+
+    Instrumentation is off by default. Instrumented methods are only wrapped while the
+    instrumentation is switched on, so that the original, unwrapped methods run when it's
+    switched off. Call sites that are instrumented inline check the enabled flag before
+    doing any bookkeeping, so that their cost is a single attribute lookup.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._counters = Counter()
+        self._timers = {}  # Maps stage names to [calls, seconds] pairs.
+        self._methods = weakref.WeakKeyDictionary()  # Maps classes to (name, original, wrapped) tuples.
+
+    def __repr__(self):
+        return str(self.records())
+
+    def enable(self) -> None:
+        """
+        Switches instrumentation on, installing the wrappers of all instrumented methods.
+        Note that bound methods obtained before this call remain unwrapped.
+        """
+        self.enabled = True
+        for (owner, methods) in list(self._methods.items()):
+            for (name, _, wrapped) in methods:
+                setattr(owner, name, wrapped)
+
+    def disable(self) -> None:
+        """
+        Switches instrumentation off, restoring the original instrumented methods.
+        """
+        self.enabled = False
+        for (owner, methods) in list(self._methods.items()):
+            for (name, original, _) in methods:
+                setattr(owner, name, original)
+
+    def register(self, owner: type, name: str, original: Any, wrapped: Any) -> None:
+        """
+        Registers an instrumented method, and installs the variant that matches the
+        current state of the instrumentation. Classes are only weakly referenced, so that
+        registering doesn't keep, e.g., classes created inside functions alive. Note that
+        methods that refer to their own class, e.g., through a zero-argument super(), do
+        keep their class alive.
+        """
+        self._methods.setdefault(owner, []).append((name, original, wrapped))
+        setattr(owner, name, wrapped if self.enabled else original)
+
+    def reset(self) -> None:
+        """
+        Clears all collected counters and timers.
+        """
+        self._counters.clear()
+        self._timers.clear()
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """
+        Adds the given amount to the named counter.
+        """
+        self._counters[counter] += amount
+
+    def record(self, stage: str, seconds: float, calls: int = 1) -> None:
+        """
+        Adds the given elapsed time to the named stage timer.
+        """
+        timer = self._timers.setdefault(stage, [0, 0.0])
+        timer[0] += calls
+        timer[1] += seconds
+
+    def iterate(self, stage: str, counter: Optional[str], iterator: Iterator[Any]) -> Iterator[Any]:
+        """
+        A generator that yields from the given iterator, timing each advancement and
+        counting the yielded items. Posting lists and merged posting lists are produced
+        lazily, so this is where the actual work happens. Note that timers for nested
+        iterators are inclusive, i.e., the time spent merging includes the time spent
+        producing the postings being merged.
+        """
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += perf_counter() - start
+                count += 1
+                yield item
+        finally:
+            self.record(stage, seconds, 0)
+            if counter:
+                self.increment(counter, count)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """
+        Returns the collected metrics as a list of structured records, suitable for
+        logging or for serializing as JSON.
+        """
+        records = [{"type": "counter", "name": name, "value": value} for (name, value) in sorted(self._counters.items())]
+        records.extend({"type": "timer", "name": name, "calls": calls, "seconds": seconds}
+                       for (name, (calls, seconds)) in sorted(self._timers.items()))
+        return records
+
+    def prometheus(self, prefix: str = "inf3800") -> str:
+        """
+        Returns the collected metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for (name, value) in sorted(self._counters.items()):
+            metric = prefix + "_" + name.replace(".", "_") + "_total"
+            lines.append("# TYPE " + metric + " counter")
+            lines.append(metric + " " + str(value))
+        for (suffix, index) in [("calls_total", 0), ("seconds_total", 1)]:
+            metric = prefix + "_stage_" + suffix
+            lines.append("# TYPE " + metric + " counter")
+            for (name, timer) in sorted(self._timers.items()):
+                lines.append(metric + "{stage=\"" + name + "\"} " + repr(timer[index]))
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide metrics registry that instrumented code reports to.
+metrics = Metrics()
+
+
+class _Instrumented:
+    """
+    Placeholder for an instrumented method in a class body. Once the class is created,
+    the placeholder replaces itself with the original method and registers the wrapped
+    variant of it, so that the two can be swapped as the instrumentation is switched on
+    and off.
+
+    If the placeholder never ends up in a class body, e.g., if it decorates a function
+    at module level or is itself decorated, it falls back to behaving like the wrapped
+    variant, which checks the enabled flag on every call.
+    """
+
+    def __init__(self, method: Any, wrapper: Callable):
+        self._method = method
+        self._wrapper = wrapper
+        self._wrapped = staticmethod(wrapper) if isinstance(method, staticmethod) else wrapper
+        functools.update_wrapper(self, wrapper)
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        metrics.register(owner, name, self._method, self._wrapped)
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Any:
+        return self._wrapped.__get__(instance, owner)
+
+    def __call__(self, *args, **kwargs):
+        return self._wrapper(*args, **kwargs)
+
+
+def instrumented(stage: str, counter: Optional[str] = None, lazy: bool = False) -> Callable:
+    """
+    Decorator for methods, that times calls to the decorated method as the named stage.
+    For lazy methods, i.e., methods that return iterators, we also time the traversal of
+    the returned iterator, and the counter counts the yielded items. Otherwise, the
+    counter counts the calls. Static methods are decorated on top of @staticmethod.
+
+    Since the decorator preserves the method's signature, implementations of abstract
+    base classes can be instrumented without changing the base classes themselves.
+    """
+
+    def decorator(method: Any) -> Any:
+        static = isinstance(method, staticmethod)
+        function = method.__func__ if static else method
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            result = function(*args, **kwargs)
+            metrics.record(stage, perf_counter() - start)
+            if lazy:
+                return metrics.iterate(stage, counter, iter(result))
+            if counter:
+                metrics.increment(counter)
+            return result
+
+        return _Instrumented(method, wrapper)
+
+    return decorator
+
+
+def main():
+    """
+    Example usage. A tiny unit test, in a sense.
+    """
+
+    class Example:
+
+        @instrumented("squares", "squares_produced", lazy=True)
+        @staticmethod
+        def squares(n):
+            return (i * i for i in range(n))
+
+        @instrumented("lookup", "lookups")
+        def lookup(self, n):
+            return n
+
+    original = Example.lookup
+    assert list(Example.squares(3)) == [0, 1, 4]
+    assert metrics.records() == []
+    metrics.enable()
+    assert Example.lookup is not original
+    assert list(Example.squares(3)) == [0, 1, 4]
+    assert Example().lookup(7) == 7
+    metrics.increment("cache_hits", 2)
+    metrics.disable()
+    assert Example.lookup is original
+    Example().lookup(7)
+    print(metrics)
+    print(metrics.prometheus())
+    counters = {r["name"]: r["value"] for r in metrics.records() if r["type"] == "counter"}
+    assert counters == {"cache_hits": 2, "lookups": 1, "squares_produced": 3}
+    timers = {r["name"]: r["calls"] for r in metrics.records() if r["type"] == "timer"}
+    assert timers == {"lookup": 1, "squares": 1}
+    assert "inf3800_cache_hits_total 2" in metrics.prometheus()
+    metrics.reset()
+    assert metrics.records() == []
+
+    # Outside of class bodies we fall back to wrappers that check the enabled flag.
+    @functools.lru_cache()
+    @instrumented("stacked")
+    def stacked(n):
+        return n
+
+    @instrumented("function")
+    def function(n):
+        return n
+
+    Example.late = instrumented("late")(lambda self, n: n)
+    assert function(1) == 1 and stacked(1) == 1 and Example().late(1) == 1
+    assert metrics.records() == []
+    metrics.enable()
+    assert function(2) == 2 and stacked(2) == 2 and Example().late(2) == 2
+    metrics.disable()
+    timers = {r["name"]: r["calls"] for r in metrics.records() if r["type"] == "timer"}
+    assert timers == {"function": 1, "stacked": 1, "late": 1}
+    metrics.reset()
+
+    # Registered classes aren't kept alive by the registry.
+    import gc
+    reference = weakref.ref(Example)
+    del Example, original
+    gc.collect()
+    assert reference() is None
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from dictionary import InMemoryDictionary
 from normalization import Normalizer
 from tokenization import Tokenizer
 from corpus import Corpus
+from instrumentation import instrumented
 from typing import Iterable, Iterator
 
 
@@ -79,9 +80,11 @@ class InMemoryInvertedIndex(InvertedIndex):
         """
         raise NotImplementedError
 
+    @instrumented("terms")
     def get_terms(self, buffer: str) -> Iterable[str]:
         return [self._normalizer.normalize(t) for t in self._tokenizer.strings(self._normalizer.canonicalize(buffer))]
 
+    @instrumented("postings", "postings_scanned", lazy=True)
     def get_postings_iterator(self, term: str) -> Iterator[Posting]:
         # In a serious application a postings list would be stored as a contiguous buffer
         # storing compressed integers, and the iterator would facilitate loading this buffer
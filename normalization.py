@@ -1,7 +1,10 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import unicodedata
 from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from instrumentation import metrics
 
 
 class Normalizer(ABC):
@@ -46,6 +49,295 @@ class BrainDeadNormalizer(Normalizer):
         return token.lower()
 
 
+class StemmingNormalizer(Normalizer):
+    """
+    Abstract base class for simple rule-based stemmers in the Snowball tradition, i.e.,
+    that strip suffixes off case folded tokens in a series of steps. In each step we find
+    the longest matching suffix and remove or replace it, provided that the suffix lies
+    within the step's region and is preceded by a valid ending. Otherwise the step leaves
+    the token untouched, i.e., we don't fall back to shorter suffixes.
+
+    R1 is the region after the first non-vowel following a vowel, but at least a given
+    number of characters into the token. R2 is the region after the first non-vowel
+    following a vowel in R1.
+
+    Since normalization happens once per token occurrence and most token occurrences are
+    repetitions of a relatively small set of surface forms, results are memoized in a
+    bounded cache keyed by the surface form. A cache size of zero disables the cache.
+    """
+
+    _vowels = "aeiouy"
+
+    # Suffixes that may only be removed when preceded by one of the given letters.
+    _endings = {}  # type: Dict[str, str]
+
+    # Minimum start position of R1.
+    _r1_minimum = 3
+
+    # The suffix stripping steps, applied in order. Each step names the region its
+    # suffixes must lie within, and maps suffixes to their replacements.
+    _steps = []  # type: List[Tuple[str, Dict[str, str]]]
+
+    def __init__(self, cache_size: int = 100000):
+        assert cache_size >= 0
+        self._cache_size = cache_size
+        self._cache = {}
+        self._lengths = [sorted({len(suffix) for suffix in rules}, reverse=True) for (_, rules) in self._steps]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    def canonicalize(self, buffer: str) -> str:
+        """
+        Applies Unicode NFKC normalization, so that composed and decomposed characters and
+        compatibility variants such as ligatures and full-width forms compare as equal.
+        """
+        return unicodedata.normalize("NFKC", buffer)
+
+    def normalize(self, token: str) -> str:
+        """
+        Case folds and stems the given token. When the cache is full an arbitrary old
+        entry is evicted, which is cheaper than strict LRU and works well in practice.
+        """
+        term = self._cache.get(token)
+        if term is None:
+            if metrics.enabled:
+                metrics.increment("cache_misses")
+            term = self._stem(token.casefold())
+            if self._cache_size:
+                if len(self._cache) >= self._cache_size:
+                    del self._cache[next(iter(self._cache))]
+                self._cache[token] = term
+        elif metrics.enabled:
+            metrics.increment("cache_hits")
+        return term
+
+    def _region(self, word: str, start: int) -> int:
+        """
+        Returns the position after the first non-vowel following a vowel, searching the
+        given word from the given start position.
+        """
+        for i in range(start + 1, len(word)):
+            if word[i] not in self._vowels and word[i - 1] in self._vowels:
+                return i + 1
+        return len(word)
+
+    def _regions(self, word: str) -> Tuple[int, int]:
+        """
+        Returns the start positions of the regions R1 and R2 in the given word.
+        """
+        r1 = self._region(word, 0)
+        return max(r1, self._r1_minimum), self._region(word, r1)
+
+    def _strip(self, word: str, step: int) -> Tuple[str, Optional[str]]:
+        """
+        Applies the given suffix stripping step to the given case folded word. Returns
+        the resulting word and the removed suffix, if any.
+        """
+        (region, rules) = self._steps[step]
+        for length in self._lengths[step]:
+            if length >= len(word):
+                continue
+            suffix = word[-length:]
+            replacement = rules.get(suffix)
+            if replacement is None:
+                continue
+            start = self._regions(word)[0 if region == "R1" else 1]
+            if len(word) - length < start or word[-length - 1] not in self._endings.get(suffix, word[-length - 1]):
+                break
+            return word[:-length] + replacement, suffix
+        return word, None
+
+    def _stem(self, word: str) -> str:
+        """
+        Applies the suffix stripping steps to the given case folded word.
+        """
+        for step in range(len(self._steps)):
+            (word, _) = self._strip(word, step)
+        return word
+
+
+class NorwegianNormalizer(StemmingNormalizer):
+    """
+    A light suffix stripping stemmer for Norwegian (bokmål), loosely based on the
+    Snowball stemmer.
+    """
+
+    _vowels = "aeiouyæåø"
+    _endings = {"s": "bcdfghjklmnoprtvyz"}
+    _steps = [("R1", {**dict.fromkeys(["hetenes", "hetene", "hetens", "heter", "heten", "endes", "ande", "ende",
+                                       "edes", "enes", "ede", "ane", "ene", "ens", "ers", "ets", "het", "ast", "en",
+                                       "ar", "er", "as", "es", "et", "a", "e", "s"], ""), "erte": "er", "ert": "er"}),
+              ("R1", {"dt": "d", "vt": "v"}),
+              ("R1", dict.fromkeys(["hetslov", "eleg", "elig", "elov", "slov", "leg", "eig", "lig", "els", "lov",
+                                    "ig"], ""))]
+
+
+class DanishNormalizer(StemmingNormalizer):
+    """
+    A light suffix stripping stemmer for Danish, loosely based on the Snowball stemmer.
+    """
+
+    _vowels = "aeiouyæåø"
+    _endings = {"s": "abcdfghjklmnoprtvyzå"}
+    _steps = [("R1", dict.fromkeys(["erendes", "erende", "hedens", "ethed", "erede", "heden", "heder", "endes",
+                                    "ernes", "erens", "erets", "ered", "ende", "erne", "eren", "erer", "heds", "enes",
+                                    "eres", "eret", "hed", "ene", "ere", "ens", "ers", "ets", "en", "er", "es", "et",
+                                    "e", "s"], "")),
+              ("R1", {"gd": "g", "dt": "d", "gt": "g", "kt": "k"}),
+              ("R1", dict.fromkeys(["elig", "løst", "lig", "els", "ig"], ""))]
+
+
+class GermanNormalizer(StemmingNormalizer):
+    """
+    A light suffix stripping stemmer for German, loosely based on the Snowball stemmer.
+    Umlauts are folded away, and case folding already maps "ß" to "ss".
+    """
+
+    _vowels = "aeiouyäöü"
+    _endings = {"s": "bdfghklmnrt", "st": "bdfghklmnt"}
+    _steps = [("R1", dict.fromkeys(["ern", "em", "er", "en", "es", "e", "s"], "")),
+              ("R1", dict.fromkeys(["est", "en", "er", "st"], "")),
+              ("R2", dict.fromkeys(["isch", "lich", "heit", "keit", "end", "ung", "ig", "ik"], ""))]
+    _umlauts = str.maketrans("äöü", "aou")
+
+    def _stem(self, word: str) -> str:
+        return super()._stem(word).translate(self._umlauts)
+
+
+class EnglishNormalizer(StemmingNormalizer):
+    """
+    A suffix stripping stemmer for English, following the Porter2 stemmer except for
+    its rule for removing "ative" in R2.
+    """
+
+    _r1_minimum = 0
+    _endings = {"li": "cdeghkmnrt", "ogi": "l", "ion": "st"}
+    _doubles = {"bb", "dd", "ff", "gg", "mm", "nn", "pp", "rr", "tt"}
+    _prefixes = ["gener", "commun", "arsen"]
+    _exceptions = {"skis": "ski", "skies": "sky", "dying": "die", "lying": "lie", "tying": "tie", "idly": "idl",
+                   "gently": "gentl", "ugly": "ugli", "early": "earli", "only": "onli", "singly": "singl",
+                   "news": "news", "atlas": "atlas", "cosmos": "cosmos", "bias": "bias", "andes": "andes"}
+    _invariants = {"inning", "outing", "canning", "herring", "earring", "proceed", "exceed", "succeed"}
+
+    # Step 1b, with suffixes listed longest first. The "eed" suffixes must lie in R1, the
+    # others must be preceded by a vowel.
+    _step1b = {"eedly": "ee", "ingly": "", "edly": "", "eed": "ee", "ing": "", "ed": ""}
+
+    _steps = [("R1", {"ational": "ate", "tional": "tion", "ization": "ize", "iveness": "ive", "fulness": "ful",
+                      "ousness": "ous", "biliti": "ble", "ation": "ate", "alism": "al", "aliti": "al",
+                      "iviti": "ive", "ousli": "ous", "entli": "ent", "fulli": "ful", "lessli": "less",
+                      "ator": "ate", "alli": "al", "enci": "ence", "anci": "ance", "izer": "ize", "abli": "able",
+                      "bli": "ble", "ogi": "og", "li": ""}),
+              ("R1", {"ational": "ate", "tional": "tion", "alize": "al", "icate": "ic", "iciti": "ic", "ical": "ic",
+                      "ful": "", "ness": ""}),
+              ("R2", dict.fromkeys(["ement", "ance", "ence", "able", "ible", "ment", "ant", "ent", "ism", "ate",
+                                    "iti", "ous", "ive", "ize", "ion", "al", "er", "ic"], ""))]
+
+    def _regions(self, word: str) -> Tuple[int, int]:
+        # A few common prefixes would otherwise get too short an R1.
+        for prefix in self._prefixes:
+            if word.startswith(prefix):
+                return len(prefix), self._region(word, len(prefix))
+        return super()._regions(word)
+
+    def _short_syllable(self, word: str) -> bool:
+        """
+        Checks if the given word ends in a short syllable, i.e., a vowel followed by a
+        non-vowel other than "w", "x" or "Y" and preceded by a non-vowel, or a vowel at
+        the beginning of the word followed by a non-vowel.
+        """
+        if len(word) == 2:
+            return word[0] in self._vowels and word[1] not in self._vowels
+        return len(word) > 2 and word[-3] not in self._vowels and word[-2] in self._vowels and \
+            word[-1] not in self._vowels and word[-1] not in "wxY"
+
+    def _short_word(self, word: str) -> bool:
+        """
+        Checks if the given word ends in a short syllable and has an empty R1.
+        """
+        return self._short_syllable(word) and self._regions(word)[0] >= len(word)
+
+    def _stem(self, word: str) -> str:
+        if len(word) <= 2:
+            return word
+        if word in self._exceptions:
+            return self._exceptions[word]
+        # An initial "y" and a "y" after a vowel act as consonants. We mark these as "Y".
+        word = "".join("Y" if c == "y" and (i == 0 or word[i - 1] in self._vowels) else c for (i, c) in enumerate(word))
+        # Step 1a. Plural forms are removed regardless of R1, otherwise short words such as
+        # "cats" would be left untouched.
+        if word.endswith("sses"):
+            word = word[:-2]
+        elif word.endswith("ies") or word.endswith("ied"):
+            word = word[:-3] + ("i" if len(word) > 4 else "ie")
+        elif word.endswith("s") and not word.endswith("us") and not word.endswith("ss"):
+            if any(c in self._vowels for c in word[:-2]):
+                word = word[:-1]
+        if word in self._invariants:
+            return word
+        word = self._stem_step1b(word)
+        # Step 1c.
+        if word.endswith("y") and len(word) > 2 and word[-2] not in self._vowels:
+            word = word[:-1] + "i"
+        word = super()._stem(word)
+        # Step 5.
+        if word.endswith("e"):
+            (r1, r2) = self._regions(word)
+            if len(word) - 1 >= r2 or (len(word) - 1 >= r1 and not self._short_syllable(word[:-1])):
+                word = word[:-1]
+        elif word.endswith("ll") and len(word) - 1 >= self._regions(word)[1]:
+            word = word[:-1]
+        return word.replace("Y", "y")
+
+    def _stem_step1b(self, word: str) -> str:
+        """
+        Removes "ed" and "ing" suffixes. If what remains ends in "at", "bl" or "iz" or is
+        a short word we add an "e", so that, e.g., "hoped" and "hope" are conflated, and
+        if it ends in a double consonant we undouble it.
+        """
+        for (suffix, replacement) in self._step1b.items():
+            if word.endswith(suffix):
+                break
+        else:
+            return word
+        stem = word[:-len(suffix)]
+        if replacement:
+            return stem + replacement if len(stem) >= self._regions(word)[0] else word
+        if not any(c in self._vowels for c in stem):
+            return word
+        if stem[-2:] in ("at", "bl", "iz"):
+            return stem + "e"
+        if stem[-2:] in self._doubles:
+            return stem[:-1]
+        if self._short_word(stem):
+            return stem + "e"
+        return stem
+
+
+def benchmark():
+    """
+    Measures normalization throughput on the sample corpora, with and without caching.
+    """
+    from corpus import InMemoryCorpus
+    from tokenization import BrainDeadTokenizer
+    from timeit import default_timer as timer
+    tokenizer = BrainDeadTokenizer()
+    normalizers = {"no": NorwegianNormalizer, "da": DanishNormalizer, "de": GermanNormalizer, "en": EnglishNormalizer}
+    for (language, normalizer_class) in normalizers.items():
+        corpus = InMemoryCorpus("data/" + language + ".txt")
+        tokens = [token for document in corpus for token in tokenizer.strings(document["body"])]
+        for cache_size in [0, 100000]:
+            normalizer = normalizer_class(cache_size)
+            start = timer()
+            for token in tokens:
+                normalizer.normalize(token)
+            elapsed = timer() - start
+            print(language, "cache_size=" + str(cache_size), len(tokens), "tokens", int(len(tokens) / elapsed), "tokens/sec")
+
+
 def main():
     """
     Example usage. A tiny unit test, in a sense.
@@ -56,7 +348,36 @@ def main():
     token = "grØnnFustaSJEOpphengsForKOBling"
     print(normalizer.normalize(token))
     assert normalizer.normalize(token) == "grønnfustasjeopphengsforkobling"
+    for (normalizer, tests) in [(NorwegianNormalizer(), [("Hestene", "hest"), ("kjærlighet", "kjær"), ("viktig", "vikt"),
+                                                         ("snakkert", "snakker")]),
+                                (DanishNormalizer(), [("hestene", "hest"), ("Bilerne", "bil")]),
+                                (GermanNormalizer(), [("Häuser", "haus"), ("Kindern", "kind"), ("Straße", "strass"),
+                                                      ("Zeitung", "zeitung"), ("wichtig", "wichtig")]),
+                                (EnglishNormalizer(), [("cats", "cat"), ("Running", "run"), ("happiness", "happi"),
+                                                       ("egg", "egg"), ("add", "add"), ("off", "off"), ("inn", "inn"),
+                                                       ("odd", "odd"), ("apply", "appli"), ("supply", "suppli"),
+                                                       ("only", "onli"), ("early", "earli"), ("reply", "repli"),
+                                                       ("family", "famili"), ("element", "element"),
+                                                       ("comment", "comment"), ("moment", "moment"),
+                                                       ("general", "general"), ("quickly", "quick"),
+                                                       ("played", "play"), ("playing", "play"), ("stayed", "stay"),
+                                                       ("hope", "hope"), ("hopes", "hope"), ("hoped", "hope"),
+                                                       ("hoping", "hope"), ("hopping", "hop"), ("use", "use"),
+                                                       ("used", "use"), ("using", "use"), ("size", "size"),
+                                                       ("sized", "size"), ("create", "creat"),
+                                                       ("created", "creat")])]:
+        for (token, expected) in tests:
+            print(token, normalizer.normalize(token))
+            assert normalizer.normalize(token) == expected
+    normalizer = NorwegianNormalizer(2)
+    assert [normalizer.normalize(t) for t in ["bilene", "bilene", "husene", "båtene"]] == ["bil", "bil", "hus", "båt"]
+    assert normalizer.canonicalize("pro\u0308ve") == "pr\u00f6ve"
+    assert normalizer.canonicalize("\ufb01ne") == "fine"
 
 
 if __name__ == "__main__":
-    main()
+    import sys
+    if sys.argv[1:] == ["benchmark"]:
+        benchmark()
+    else:
+        main()
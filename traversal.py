@@ -3,6 +3,7 @@
 
 from typing import Iterator
 from invertedindex import Posting
+from instrumentation import instrumented
 
 
 class PostingsMerger:
@@ -10,6 +11,7 @@ class PostingsMerger:
     Utility class for merging posting lists.
     """
 
+    @instrumented("merge.intersection", "postings_merged", lazy=True)
     @staticmethod
     def intersection(p1: Iterator[Posting], p2: Iterator[Posting]) -> Iterator[Posting]:
         """
@@ -21,6 +23,7 @@ class PostingsMerger:
         """
         raise NotImplementedError
 
+    @instrumented("merge.union", "postings_merged", lazy=True)
     @staticmethod
     def union(p1: Iterator[Posting], p2: Iterator[Posting]) -> Iterator[Posting]:
         """
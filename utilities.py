@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import heapq
+import os
 from typing import Callable, Iterable, Iterator, Any, Union, Tuple
 
 Number = Union[int, float]
@@ -21,6 +22,57 @@ def apply(f: Callable[[Any], Any], xs: Iterable) -> None:
         f(x)
 
 
+def snapshot(filename: str, build: Callable[[], Any], tag: str = "snapshot", dependencies: Iterable[str] = ()) -> Any:
+    """
+    Returns the object produced by the given builder function, going through a pickled
+    snapshot stored next to the given source file. The snapshot is keyed by the source
+    file's modification time and size, so that it's automatically rebuilt if the source
+    file changes. The tag distinguishes between different snapshots of the same file,
+    e.g., a loaded corpus versus a corpus with an inverted index built over it. If the
+    built object also depends on other files, these can be listed as dependencies and
+    become part of the key. The source file that defines the builder function is always
+    a dependency, so that editing the code that builds the object invalidates the snapshot.
+
+    Useful for short-lived command line tools, where reloading and reindexing the same
+    data over and over again would otherwise dominate the running time. The snapshot
+    is just a cache: If it's missing, stale or unreadable, we silently rebuild it.
+    """
+    import gc
+    import pickle
+    import tempfile
+    dependencies = [*dependencies]
+    if hasattr(build, "__code__") and os.path.isfile(build.__code__.co_filename):
+        dependencies.append(build.__code__.co_filename)
+    key = [(status.st_mtime_ns, status.st_size) for status in map(os.stat, [filename, *dependencies])]
+    cached = filename + "." + tag + ".pickle"
+    enabled = gc.isenabled()
+    gc.disable()  # Unpickling creates lots of small objects, but no garbage.
+    try:
+        with open(cached, "rb") as f:
+            if pickle.load(f) == key:
+                return pickle.load(f)
+    except Exception:
+        pass  # The snapshot is just a cache, so anything going wrong means a rebuild.
+    finally:
+        if enabled:
+            gc.enable()
+    value = build()
+    # Write to a uniquely named temporary file and move it into place, so that concurrent
+    # runs never observe or clobber each other's partially written snapshots.
+    temporary = None
+    try:
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(cached) or ".", suffix=".tmp", delete=False) as f:
+            temporary = f.name
+            pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cached)
+    except Exception:
+        # Not writable or not picklable, so there will be no snapshot this time.
+        if temporary:
+            os.remove(temporary)
+    return value
+
+
 class Sieve:
     """
     Implements a "sieve", i.e., a heap-based data structure through which